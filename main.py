@@ -1,181 +1,639 @@
 # main.py - v1.5
-from playwright.sync_api import sync_playwright, TimeoutError
+import asyncio
 import json
 import csv
+import heapq
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-import requests # Import the requests module
-import os # Import os module to check for file existence
+from functools import partial
+from operator import itemgetter
+import os # Import os module for environment variables and file handling
 import sys # Import sys to control the script's exit code
 
+# orjson is faster for parsing the config and printing summaries; fall back to the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Resource types and third-party hosts that are not needed to read the ticket listings
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "segment.com",
+    "segment.io",
+)
+
+# Set LOG_JSON_RESPONSES=1 to list the JSON endpoints the event page calls while loading
+LOG_JSON_RESPONSES = os.environ.get('LOG_JSON_RESPONSES') == '1'
+
+# Cookies and local storage saved after a successful scrape and loaded on the next run
+STORAGE_STATE_PATH = "state.json"
+
+# Lighter Chromium profile for headless runs in CI/containers
+BROWSER_LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-accelerated-2d-canvas",
+    "--disable-gpu",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-background-networking",
+    "--disable-extensions",
+]
+
+# Number of Pushbullet pushes sent in parallel
+PUSHBULLET_MAX_WORKERS = 8
+# How many times a push is attempted when Pushbullet answers 429 Too Many Requests
+PUSHBULLET_MAX_ATTEMPTS = 5
+# Longest single wait (seconds) before retrying a push; alerts are sent while a scrape holds its
+# browser slot, so a longer Retry-After gives up instead of stalling the scrape
+PUSHBULLET_MAX_RETRY_DELAY = 10
+# Shared HTTP session, created on first use by get_pushbullet_session()
+_pushbullet_session = None
+# Alerts for several events can arrive from different threads at once
+_pushbullet_session_lock = threading.Lock()
+
+# Strip everything but the number from the availability and price texts
+NON_DIGIT_RE = re.compile(r'\D')
+NON_PRICE_RE = re.compile(r'[^\d,]')
+
+# Field accessors for the scraped ticket dicts, shared by the summary code
+get_price = itemgetter('price')
+get_availability = itemgetter('availability')
+
+# Collects the text of the four spans in each matched ticket container inside the page
+EXTRACT_TICKETS_JS = """
+(containers) => containers.map(container => {
+    const spans = container.querySelectorAll('span');
+    if (spans.length !== 4) return null;
+    return {
+        type: spans[0].innerText,
+        availability: spans[1].innerText,
+        category: spans[2].innerText,
+        price: spans[3].innerText
+    };
+}).filter(Boolean)
+"""
+
+async def block_unneeded_requests(route):
+    """Aborts requests for assets and trackers so only the page and its data load."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(host in request.url for host in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+def parse_availability(text):
+    """Turns an availability text like "2 beschikbaar" into 2."""
+    return int(NON_DIGIT_RE.sub('', text))
+
+def parse_price(text):
+    """Turns a price text like "€ 189,50 per stuk" into 189.5."""
+    return float(NON_PRICE_RE.sub('', text).replace(',', '.'))
+
+def parse_json(text):
+    """Parses a JSON string from the environment, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def load_json_setting(name, default, is_valid, expected):
+    """
+    Parses a JSON environment variable once and checks its shape,
+    exiting with a clear message instead of failing later mid-scrape.
+    """
+    raw = os.environ.get(name)
+    if not raw:
+        return default
+    try:
+        value = parse_json(raw)
+    except ValueError as e:
+        sys.exit(f"❌ {name} is not valid JSON: {e}")
+    if not is_valid(value):
+        sys.exit(f"❌ {name} must be {expected}.")
+    return value
+
+def load_int_setting(name, default, minimum):
+    """Reads an integer environment variable, exiting with a clear message if it's not a number or too small."""
+    raw = os.environ.get(name)
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        sys.exit(f"❌ {name} must be a whole number, got {raw!r}.")
+    if value < minimum:
+        sys.exit(f"❌ {name} must be at least {minimum}, got {value}.")
+    return value
+
+def is_token_list(value):
+    return isinstance(value, list) and all(isinstance(token, str) for token in value)
+
+def is_event_map(value):
+    return isinstance(value, dict) and all(
+        isinstance(name, str) and isinstance(url, str) for name, url in value.items())
+
+def format_json(data):
+    """Pretty-prints data as indented, non-ASCII-escaped JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+def log_json_response(event_name, response):
+    """Prints the URL of every JSON XHR/fetch response, to help locate the ticket data API."""
+    if response.request.resource_type in ("xhr", "fetch") and "json" in response.headers.get("content-type", ""):
+        print(f"[{event_name}] JSON response: {response.status} {response.url}")
+
+def get_pushbullet_session():
+    """
+    Returns the shared Pushbullet session so repeated pushes reuse keep-alive connections.
+    requests is imported here so runs that never send an alert don't pay for the import.
+    """
+    global _pushbullet_session
+    with _pushbullet_session_lock:
+        if _pushbullet_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _pushbullet_session = requests.Session()
+            # The connection pool is sized to the number of parallel senders
+            _pushbullet_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=PUSHBULLET_MAX_WORKERS))
+        return _pushbullet_session
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying a rate-limited push: Retry-After plus exponential backoff and jitter."""
+    try:
+        retry_after = int(response.headers.get('Retry-After', 1))
+    except ValueError:
+        retry_after = 1
+    return retry_after + 2 ** attempt + random.random()
+
+def send_pushbullet_push(session, token, title, message):
+    """Sends a single Pushbullet note to one user, retrying when rate limited."""
+    print(f"Sending alert to token ending in ...{token[-4:]}")
+    data = {"type": "note", "title": title, "body": message}
+    headers = {"Access-Token": token}
+    try:
+        for attempt in range(PUSHBULLET_MAX_ATTEMPTS):
+            response = session.post('https://api.pushbullet.com/v2/pushes', headers=headers, json=data, timeout=5)
+            if response.status_code != 429 or attempt == PUSHBULLET_MAX_ATTEMPTS - 1:
+                break
+            delay = retry_delay(response, attempt)
+            if delay > PUSHBULLET_MAX_RETRY_DELAY:
+                print(f"⏳ Pushbullet asked ...{token[-4:]} to wait {delay:.1f}s, which is over the {PUSHBULLET_MAX_RETRY_DELAY}s limit; giving up.")
+                break
+            print(f"⏳ Pushbullet rate limit hit for ...{token[-4:]}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        if 200 <= response.status_code < 300:
+            print(f"✅ Pushbullet alert sent successfully to ...{token[-4:]}!")
+        else:
+            print(f"❌ Failed to send Pushbullet alert to ...{token[-4:]}: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"❌ An error occurred while sending Pushbullet alert: {e}")
+
 def send_pushbullet_alert(api_tokens, title, message):
-    """Sends a notification via Pushbullet to multiple users."""
+    """Sends a notification via Pushbullet to multiple users in parallel."""
     if not api_tokens:
         print("No Pushbullet tokens provided. Skipping notification.")
         return
         
     print("Attempting to send Pushbullet notifications...")
+    valid_tokens = []
     for token in api_tokens:
         if not token or "YOUR_PUSHBULLET_ACCESS_TOKEN" in token:
             print("Skipping invalid or placeholder token.")
             continue
-        
-        print(f"Sending alert to token ending in ...{token[-4:]}")
-        data = {"type": "note", "title": title, "body": message}
-        headers = {"Access-Token": token}
+        valid_tokens.append(token)
+    if not valid_tokens:
+        return
+
+    # Pushes are network-bound, so send them all at once; the session is shared between threads
+    session = get_pushbullet_session()
+    with ThreadPoolExecutor(max_workers=min(PUSHBULLET_MAX_WORKERS, len(valid_tokens))) as executor:
+        send_one = partial(send_pushbullet_push, session, title=title, message=message)
+        list(executor.map(send_one, valid_tokens))
+
+@dataclass(eq=False)
+class BrowserInstance:
+    """A launched browser plus the bookkeeping the pool uses to share and recycle it."""
+    browser: object
+    created_at: float = field(default_factory=time.monotonic)
+    pages_served: int = 0
+    active_contexts: int = 0
+
+@dataclass
+class BrowserPool:
+    """
+    Keeps warm Chromium instances around so repeated scrapes skip the browser cold start.
+    Each browser is shared by up to max_contexts_per_browser scrapes, one context each.
+    Browsers are launched lazily, health-checked before reuse and recycled once they get
+    too old or have served too many pages.
+    """
+    playwright: object
+    size: int = 1
+    max_contexts_per_browser: int = 3
+    max_age_seconds: float = 3600
+    max_pages_per_browser: int = 50
+    _pool: list = field(default_factory=list) # Live instances that still accept new contexts
+    _lock: asyncio.Lock = field(init=False)
+    _semaphore: asyncio.Semaphore = field(init=False)
+
+    def __post_init__(self):
+        # A zero-sized semaphore would make acquire() wait forever
+        if self.size < 1 or self.max_contexts_per_browser < 1:
+            raise ValueError("BrowserPool size and max_contexts_per_browser must be at least 1")
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self.size * self.max_contexts_per_browser)
+
+    def _needs_recycling(self, instance):
+        return (not instance.browser.is_connected()
+                or instance.pages_served >= self.max_pages_per_browser
+                or time.monotonic() - instance.created_at >= self.max_age_seconds)
+
+    async def _launch(self):
+        print("Launching headless browser...")
+        browser = await self.playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        return BrowserInstance(browser)
+
+    async def _retire(self, instance):
+        if instance.browser.is_connected():
+            await instance.browser.close()
+
+    async def _checkout(self):
+        """Picks a healthy browser with a free context slot, launching one if needed."""
+        async with self._lock:
+            for candidate in list(self._pool):
+                if self._needs_recycling(candidate):
+                    print("Recycling browser instance.")
+                    self._pool.remove(candidate)
+                    # Browsers still in use are closed once their last context is released
+                    if candidate.active_contexts == 0:
+                        await self._retire(candidate)
+            instance = next((i for i in self._pool if i.active_contexts < self.max_contexts_per_browser), None)
+            if instance is None:
+                instance = await self._launch()
+                self._pool.append(instance)
+            instance.active_contexts += 1
+            return instance
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Lends out a shared browser for the caller to open its own context in."""
+        async with self._semaphore:
+            instance = await self._checkout()
+            try:
+                yield instance.browser
+            finally:
+                instance.active_contexts -= 1
+                instance.pages_served += 1
+                if instance not in self._pool and instance.active_contexts == 0:
+                    await self._retire(instance)
+
+    async def close(self):
+        print("Closing the browser pool.")
+        while self._pool:
+            await self._retire(self._pool.pop())
+
+def load_saved_storage_state(event_name):
+    """
+    Returns the storage state saved by an earlier run, or None if there is none.
+    A truncated or corrupt file is removed, since it would otherwise break every later run.
+    """
+    try:
+        with open(STORAGE_STATE_PATH, encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        state = None
+        error = e
+    else:
+        error = None if isinstance(state, dict) else "not a JSON object"
+    if error is None:
+        return state
+
+    print(f"[{event_name}] Could not load {STORAGE_STATE_PATH}, starting with a fresh context: {error}")
+    try:
+        os.remove(STORAGE_STATE_PATH)
+    except FileNotFoundError:
+        pass
+    return None
+
+async def new_event_context(browser, event_name):
+    """
+    Opens a browser context, reusing cookies from an earlier run when they were saved so the
+    consent banner is usually already dismissed. Returns the context and whether state was loaded.
+    """
+    # A regular desktop viewport; debug screenshots are full-page so they still capture everything
+    viewport = {"width": 1366, "height": 768}
+    storage_state = load_saved_storage_state(event_name)
+    # Browser errors here (e.g. a crashed browser) propagate; they say nothing about the state file
+    context = await browser.new_context(viewport=viewport, storage_state=storage_state)
+    return context, storage_state is not None
+
+async def save_storage_state(context, event_name):
+    """
+    Saves the context's cookies for the next run. Each event writes its own temporary file and
+    swaps it into place, so concurrent events never leave a half-written state file behind.
+    """
+    temp_path = f"{STORAGE_STATE_PATH}.{os.getpid()}.{id(context)}.tmp"
+    try:
+        await context.storage_state(path=temp_path)
+        os.replace(temp_path, STORAGE_STATE_PATH)
+    except Exception as e:
+        print(f"[{event_name}] Could not save browser storage state: {e}")
         try:
-            response = requests.post('https://api.pushbullet.com/v2/pushes', headers=headers, json=data)
-            if response.status_code == 200:
-                print(f"✅ Pushbullet alert sent successfully to ...{token[-4:]}!")
-            else:
-                print(f"❌ Failed to send Pushbullet alert to ...{token[-4:]}: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"❌ An error occurred while sending Pushbullet alert: {e}")
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
 
-def scrape_ticket_info(url, api_tokens, alert_threshold):
+async def scrape_ticket_info(pool, event_name, url, api_tokens, alert_threshold):
     """
-    Scrapes detailed ticket information from a given URL using Playwright.
+    Scrapes detailed ticket information for one event using a browser from the pool.
+    Each event gets its own browser context; the pool caps how many run at once.
     Sends an immediate alert if a cheap ticket is found.
     """
-    with sync_playwright() as p:
-        
-        print("Launching headless browser...")
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        # Set a custom viewport for the browser window
-        page.set_viewport_size({"width": 1000, "height": 2000})
-        
+    from playwright.async_api import TimeoutError
+
+    async with pool.acquire() as browser:
+        context = None
+        page = None
         scraped_data = []
         alert_sent_this_run = False # Flag to ensure only one alert is sent
 
         try:
-            print(f"Navigating to: {url}")
-            page.goto(url, timeout=60000)
+            context, has_saved_state = await new_event_context(browser, event_name)
+            page = await context.new_page()
+            await page.route("**/*", block_unneeded_requests)
+            if LOG_JSON_RESPONSES:
+                page.on("response", lambda response: log_json_response(event_name, response))
+
+            print(f"[{event_name}] Navigating to: {url}")
+            await page.goto(url, timeout=60000, wait_until='domcontentloaded')
 
             try:
-                print("Checking for cookie consent banner...")
+                print(f"[{event_name}] Checking for cookie consent banner...")
                 cookie_button_selector = "#onetrust-accept-btn-handler"
-                page.click(cookie_button_selector, timeout=5000)
-                print("Accepted cookies.")
+                # With saved cookies the banner is expected to be absent, so don't wait long for it
+                await page.click(cookie_button_selector, timeout=1000 if has_saved_state else 5000)
+                print(f"[{event_name}] Accepted cookies.")
             except TimeoutError:
-                print("No cookie banner found, or it was already accepted.")
+                print(f"[{event_name}] No cookie banner found, or it was already accepted.")
             except Exception as e:
-                print(f"An error occurred trying to accept cookies: {e}")
+                print(f"[{event_name}] An error occurred trying to accept cookies: {e}")
 
             container_selector = '[data-testid="ticketTypeInfo"]'
-            print("Waiting for ticket information to load...")
-            time.sleep(30)
-            page.wait_for_selector(container_selector, state='visible', timeout=30000) 
-            print("Ticket information loaded.")
-
-            print("Scraping ticket details...")
-            ticket_containers = page.query_selector_all(container_selector)
-            if not ticket_containers:
-                print("Could not find any ticket information containers.")
+            print(f"[{event_name}] Waiting for ticket information to load...")
+            await page.wait_for_selector(container_selector, state='visible', timeout=30000)
+            print(f"[{event_name}] Ticket information loaded.")
+
+            print(f"[{event_name}] Scraping ticket details...")
+            # Read every listing in a single round-trip to the browser
+            raw_tickets = await page.locator(container_selector).evaluate_all(EXTRACT_TICKETS_JS)
+            if not raw_tickets:
+                print(f"[{event_name}] Could not find any ticket information containers.")
                 return []
                 
-            for container in ticket_containers:
-                spans = container.query_selector_all('span')
-                if len(spans) == 4:
-                    availability_text = spans[1].inner_text()
-                    availability_int = int(availability_text.lower().replace('beschikbaar', '').strip())
-                    price_text = spans[3].inner_text()
-                    price_float = float(price_text.replace('€', '').replace('per stuk', '').replace(',', '.').strip())
-                    
-                    # --- IMMEDIATE ALERT LOGIC ---
-                    if not alert_sent_this_run and price_float < alert_threshold:
-                        print(f"\nIMMEDIATE ALERT: Cheap ticket found! Price: €{price_float}")
-                        alert_title = f"Cheap Ticket Alert: €{price_float}"
-                        alert_message = (f"A ticket for Lowlands is available for €{price_float}")
-                        send_pushbullet_alert(api_tokens, alert_title, alert_message)
-                        alert_sent_this_run = True # Set flag to prevent more alerts
-                    
-                    ticket_info = {
-                        "type": spans[0].inner_text(),
-                        "availability": availability_int,
-                        "category": spans[2].inner_text(),
-                        "price": price_float
-                    }
-                    scraped_data.append(ticket_info)
+            for raw in raw_tickets:
+                availability_int = parse_availability(raw['availability'])
+                price_float = parse_price(raw['price'])
+                
+                # --- IMMEDIATE ALERT LOGIC ---
+                if not alert_sent_this_run and price_float < alert_threshold:
+                    print(f"\n[{event_name}] IMMEDIATE ALERT: Cheap ticket found! Price: €{price_float}")
+                    alert_title = f"Cheap Ticket Alert: €{price_float}"
+                    alert_message = (f"A ticket for {event_name} is available for €{price_float}")
+                    # The Pushbullet call is blocking, so keep it off the event loop
+                    await asyncio.to_thread(send_pushbullet_alert, api_tokens, alert_title, alert_message)
+                    alert_sent_this_run = True # Set flag to prevent more alerts
+                
+                ticket_info = {
+                    "type": raw['type'],
+                    "availability": availability_int,
+                    "category": raw['category'],
+                    "price": price_float
+                }
+                scraped_data.append(ticket_info)
+
+            await save_storage_state(context, event_name)
             return scraped_data
         except TimeoutError:
-            print("The page timed out or the ticket elements were not found in time.")
-            screenshot_path = "debug_screenshot.png"
-            page.screenshot(path=screenshot_path, full_page=True)
-            print(f"Screenshot saved to {screenshot_path} for debugging.")
+            print(f"[{event_name}] The page timed out or the ticket elements were not found in time.")
+            if page is not None:
+                screenshot_path = debug_screenshot_path(event_name)
+                try:
+                    await page.screenshot(path=screenshot_path, full_page=True, type='jpeg', quality=60)
+                    print(f"[{event_name}] Screenshot saved to {screenshot_path} for debugging.")
+                except Exception as e:
+                    print(f"[{event_name}] Could not save a debug screenshot: {e}")
+            return []
         except Exception as e:
-            print(f"An error occurred: {e}")
+            # Discard partially scraped listings so they don't end up in the summary log
+            print(f"[{event_name}] An error occurred: {e}")
+            return []
         finally:
-            print("Closing the browser.")
-            browser.close()
-            return scraped_data
+            if context is not None:
+                print(f"[{event_name}] Closing the browser context.")
+                try:
+                    await context.close()
+                except Exception as e:
+                    print(f"[{event_name}] Could not close the browser context: {e}")
 
+def debug_screenshot_path(event_name):
+    """Builds a per-event screenshot filename so concurrent scrapes don't overwrite each other."""
+    slug = "".join(c if c.isalnum() else "_" for c in event_name.lower())
+    return f"debug_screenshot_{slug}.jpg"
 
-if __name__ == '__main__':
-    event_url = "https://www.ticketmaster.nl/event/lowlands-2025-%7C-festivalticket-tickets/658441016"
-    output_csv_filename = "tickets_summary_log.csv"
-    
-    tokens_json = os.environ.get('PUSHBULLET_TOKENS_JSON')
-    if tokens_json:
-        PUSHBULLET_API_TOKENS = json.loads(tokens_json)
-    else:
-        PUSHBULLET_API_TOKENS = []
+async def scrape_all_events(pool, events, api_tokens, alert_threshold):
+    """
+    Scrapes all events concurrently using browsers from the pool.
+    A failing event (e.g. the browser can't be launched) is logged and yields no listings,
+    so it doesn't discard the results of the others.
+    """
+    results = await asyncio.gather(*[
+        scrape_ticket_info(pool, event_name, url, api_tokens, alert_threshold)
+        for event_name, url in events.items()
+    ], return_exceptions=True)
+
+    scraped_by_event = {}
+    for event_name, result in zip(events.keys(), results):
+        if isinstance(result, Exception):
+            print(f"[{event_name}] Scrape failed: {result}")
+            result = []
+        elif isinstance(result, BaseException):
+            raise result
+        scraped_by_event[event_name] = result
+    return scraped_by_event
+
+def summarize_tickets(event_name, scraped_info, include_event=False):
+    """
+    Builds the summary row that is logged to the CSV file for one event.
+    The event name is only added as a column when several events share the log.
+    """
+    total_tickets = sum(map(get_availability, scraped_info))
+    # Pull the prices out of the dicts once and compute every statistic on the flat list
+    prices = list(map(get_price, scraped_info))
+    # Only the ten cheapest listings are needed, so avoid sorting the whole list
+    ten_cheapest = heapq.nsmallest(10, prices)
     
-    # Read the price threshold from an environment variable, with a default fallback
-    PRICE_ALERT_THRESHOLD = float(os.environ.get('PRICE_ALERT_THRESHOLD', '250.0'))
+    cheapest_price = ten_cheapest[0] if len(ten_cheapest) > 0 else float('inf')
+    most_expensive_price = max(prices) if len(prices) > 0 else 'N/A'
+    price_5th_cheapest = ten_cheapest[4] if len(ten_cheapest) >= 5 else 'N/A'
+    price_10th_cheapest = ten_cheapest[9] if len(ten_cheapest) >= 10 else 'N/A'
+
+    average_price_10_cheapest = 'N/A'
+    if len(ten_cheapest) > 0:
+        average_price_10_cheapest = round(sum(ten_cheapest) / len(ten_cheapest), 2)
 
-    print(f"Starting scraper for URL: {event_url}")
-    # Pass tokens and threshold into the scraping function
-    scraped_info = scrape_ticket_info(event_url, PUSHBULLET_API_TOKENS, PRICE_ALERT_THRESHOLD)
+    average_price_all = 'N/A'
+    if len(prices) > 0:
+        average_price_all = round(sum(prices) / len(prices), 2)
+
+    summary_data = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'listings_found': len(scraped_info),
+        'total_available_tickets': total_tickets,
+        'cheapest_price': cheapest_price if cheapest_price != float('inf') else 'N/A',
+        '5th_cheapest_price': price_5th_cheapest,
+        '10th_cheapest_price': price_10th_cheapest,
+        'most_expensive_price': most_expensive_price,
+        'average_price_10_cheapest': average_price_10_cheapest,
+        'average_price_all_tickets': average_price_all
+    }
+    if include_event:
+        summary_data['event'] = event_name
+    return summary_data
+
+
+def rotate_log_if_schema_changed(output_csv_filename, fieldnames):
+    """
+    Moves an existing log aside when its header doesn't match the rows about to be written,
+    so a change in columns starts a new file instead of appending misaligned rows.
+    """
+    try:
+        with open(output_csv_filename, newline='', encoding='utf-8') as f:
+            existing_header = next(csv.reader(f), None)
+    except FileNotFoundError:
+        return
+    if not existing_header or existing_header == fieldnames:
+        return
+    root, ext = os.path.splitext(output_csv_filename)
+    rotated_filename = f"{root}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+    os.replace(output_csv_filename, rotated_filename)
+    print(f"⚠️ Columns changed, moved the old log to {rotated_filename}")
+
+def log_summaries(scraped_by_event, output_csv_filename):
+    """Prints a summary per event and appends all of them to the CSV log in one write."""
+    # Keep the original single-event schema unless several events are logged together
+    include_event = len(scraped_by_event) > 1
+    rows_to_write = []
+    for event_name, scraped_info in scraped_by_event.items():
+        if not scraped_info:
+            print(f"\nNo ticket information was scraped for {event_name}.")
+            continue
 
-    if scraped_info:
         # Process the data to create a summary
-        print("\n--- Processing Data for Summary ---")
-        total_tickets = sum(item['availability'] for item in scraped_info)
-        sorted_tickets = sorted(scraped_info, key=lambda x: x['price'])
-        
-        cheapest_price = sorted_tickets[0]['price'] if len(sorted_tickets) > 0 else float('inf')
-        most_expensive_price = sorted_tickets[-1]['price'] if len(sorted_tickets) > 0 else 'N/A'
-        price_5th_cheapest = sorted_tickets[4]['price'] if len(sorted_tickets) >= 5 else 'N/A'
-        price_10th_cheapest = sorted_tickets[9]['price'] if len(sorted_tickets) >= 10 else 'N/A'
-
-        average_price_10_cheapest = 'N/A'
-        if len(sorted_tickets) > 0:
-            ten_cheapest_prices = [ticket['price'] for ticket in sorted_tickets[:10]]
-            average_price_10_cheapest = round(sum(ten_cheapest_prices) / len(ten_cheapest_prices), 2)
-
-        average_price_all = 'N/A'
-        if len(sorted_tickets) > 0:
-            all_prices = [ticket['price'] for ticket in sorted_tickets]
-            average_price_all = round(sum(all_prices) / len(all_prices), 2)
-
-        summary_data = {
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'listings_found': len(scraped_info),
-            'total_available_tickets': total_tickets,
-            'cheapest_price': cheapest_price if cheapest_price != float('inf') else 'N/A',
-            '5th_cheapest_price': price_5th_cheapest,
-            '10th_cheapest_price': price_10th_cheapest,
-            'most_expensive_price': most_expensive_price,
-            'average_price_10_cheapest': average_price_10_cheapest,
-            'average_price_all_tickets': average_price_all
-        }
+        print(f"\n--- Processing Data for Summary: {event_name} ---")
+        summary_data = summarize_tickets(event_name, scraped_info, include_event)
 
         print("\n--- Summary Ticket Information ---")
-        print(json.dumps(summary_data, indent=2, ensure_ascii=False))
+        print(format_json(summary_data))
+        rows_to_write.append(summary_data)
 
-        # Append Summary to CSV File
-        file_exists = os.path.exists(output_csv_filename)
+    if not rows_to_write:
+        return
+
+    # Append Summaries to CSV File
+    fieldnames = list(rows_to_write[0].keys())
+    try:
+        rotate_log_if_schema_changed(output_csv_filename, fieldnames)
+        with open(output_csv_filename, 'a+', newline='', encoding='utf-8', buffering=1 << 16) as f:
+            # Decide on the header from the open handle itself rather than a separate exists() check
+            f.seek(0, os.SEEK_END)
+            need_header = f.tell() == 0
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if need_header:
+                writer.writeheader()
+            writer.writerows(rows_to_write)
+        print(f"\n✅ {len(rows_to_write)} summary row(s) successfully appended to {output_csv_filename}")
+    except Exception as e:
+        print(f"❌ Error saving file: {e}")
+
+async def run_scraper(events, api_tokens, alert_threshold, output_csv_filename, pool_size, max_concurrency, interval_seconds):
+    """
+    Runs the scraper once, or forever every interval_seconds when an interval is set.
+    The browser pool lives for the whole process so repeated runs reuse warm browsers.
+    """
+    # Imported here so config errors and --help exit before the Playwright bindings load
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        pool = BrowserPool(p, size=pool_size, max_contexts_per_browser=max_concurrency)
         try:
-            with open(output_csv_filename, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=summary_data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(summary_data)
-            print(f"\n✅ Summary data successfully appended to {output_csv_filename}")
-        except Exception as e:
-            print(f"❌ Error saving file: {e}")
+            while True:
+                try:
+                    scraped_by_event = await scrape_all_events(pool, events, api_tokens, alert_threshold)
+                    log_summaries(scraped_by_event, output_csv_filename)
+                except Exception as e:
+                    # Keep a scheduled scraper alive; the next cycle gets a fresh attempt
+                    print(f"❌ Scrape cycle failed: {e}")
+                if interval_seconds <= 0:
+                    break
+                print(f"\nSleeping {interval_seconds}s until the next run...")
+                await asyncio.sleep(interval_seconds)
+        finally:
+            await pool.close()
 
-    else:
-        print("\nNo ticket information was scraped.")
+
+USAGE = """Usage: python main.py
+
+Scrapes Ticketmaster listings, alerts via Pushbullet on cheap tickets and appends a
+summary per event to tickets_summary_log.csv. Configured through environment variables:
+  EVENTS_JSON              JSON object of {"event name": "event url"} to scrape
+  PUSHBULLET_TOKENS_JSON   JSON list of Pushbullet access tokens
+  PRICE_ALERT_THRESHOLD    alert when a ticket is cheaper than this (default 250.0)
+  MAX_CONCURRENT_SCRAPES   number of event pages scraped at once per browser (default 3)
+  BROWSER_POOL_SIZE        number of browsers kept warm and shared between events (default 1)
+  SCRAPE_INTERVAL_SECONDS  keep running and scrape every N seconds (default 0, run once)
+  LOG_JSON_RESPONSES       set to 1 to log the JSON endpoints the event page calls
+"""
+
+if __name__ == '__main__':
+    if any(arg in ('-h', '--help') for arg in sys.argv[1:]):
+        print(USAGE)
+        sys.exit(0)
+
+    # Events to scrape, as {"name": "url"}. Can be overridden with a JSON object in EVENTS_JSON.
+    default_events = {
+        "Lowlands": "https://www.ticketmaster.nl/event/lowlands-2025-%7C-festivalticket-tickets/658441016"
+    }
+    events = load_json_setting('EVENTS_JSON', default_events, is_event_map,
+                               'a JSON object of {"event name": "event url"} strings')
+    output_csv_filename = "tickets_summary_log.csv"
+    
+    PUSHBULLET_API_TOKENS = load_json_setting('PUSHBULLET_TOKENS_JSON', [], is_token_list,
+                                              'a JSON list of Pushbullet access token strings')
+    
+    # Read the price threshold from an environment variable, with a default fallback
+    PRICE_ALERT_THRESHOLD = float(os.environ.get('PRICE_ALERT_THRESHOLD', '250.0'))
+    # Limit how many event pages are open at the same time to keep memory in check
+    MAX_CONCURRENT_SCRAPES = load_int_setting('MAX_CONCURRENT_SCRAPES', 3, minimum=1)
+    # Each browser is a full Chromium process; one shared browser is enough for most runs
+    BROWSER_POOL_SIZE = load_int_setting('BROWSER_POOL_SIZE', 1, minimum=1)
+    # Set to keep the process running and scrape on a schedule; 0 means a single run (e.g. from cron)
+    SCRAPE_INTERVAL_SECONDS = load_int_setting('SCRAPE_INTERVAL_SECONDS', 0, minimum=0)
+
+    print(f"Starting scraper for {len(events)} event(s): {', '.join(events)}")
+    asyncio.run(run_scraper(events, PUSHBULLET_API_TOKENS, PRICE_ALERT_THRESHOLD, output_csv_filename,
+                            BROWSER_POOL_SIZE, MAX_CONCURRENT_SCRAPES, SCRAPE_INTERVAL_SECONDS))